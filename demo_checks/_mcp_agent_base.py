@@ -0,0 +1,305 @@
+"""
+Shared bootstrap for the MCP chat agents in this folder: system prompt caching,
+MCP connections, LLM/tool setup, graph wiring, the parallel tools node, streamed
+rendering and the event-loop entry point. Each agent only supplies its State,
+system prompt, MCP server and chatbot node.
+
+The agents are scripts (python demo_checks/mcp_calendar_agent.py); they put this
+folder on sys.path before importing this module, so they also run as
+python -m demo_checks.<agent> from the repo root.
+"""
+import os
+import sys
+import time
+import asyncio
+from datetime import datetime
+from functools import lru_cache
+
+from langchain_groq import ChatGroq
+from langchain_mcp_adapters.client import MultiServerMCPClient
+from langgraph.graph import StateGraph, START, END
+from langchain_core.messages import SystemMessage, ToolMessage, message_chunk_to_message
+
+# 1. System Prompt Caching
+def per_minute_system_message(build_prompt):
+    """
+    Wrap build_prompt(*args, now) -> str so its SystemMessage is built at most once per
+    minute per args. Prompts should put static text first and the time last, so the
+    leading tokens stay identical across turns for provider prefix caching.
+    """
+    @lru_cache(maxsize=8)
+    def cached(args, minute):
+        return SystemMessage(content=build_prompt(*args, datetime.fromtimestamp(minute * 60)))
+
+    def system_message(*args):
+        return cached(args, int(time.time() // 60))
+    return system_message
+
+# 2. MCP Clients
+def mcp_connection(url_env: str, package: str, env: dict) -> dict:
+    """
+    Prefers a long-lived MCP server over SSE when the url_env variable is set,
+    which avoids the npx cold start on every launch. Falls back to a stdio child.
+    """
+    url = os.getenv(url_env)
+    if url:
+        return {"transport": "sse", "url": url}
+    return {
+        "command": "npx.cmd",
+        "args": ["-y", package],
+        "transport": "stdio",
+        "env": env
+    }
+
+# One client per MCP server per process, shared by every agent that asks for it
+_clients = {}
+
+def get_mcp_client(server_name: str, connection: dict) -> MultiServerMCPClient:
+    """Return the process-wide client for server_name, creating it on first use."""
+    if server_name not in _clients:
+        _clients[server_name] = MultiServerMCPClient({server_name: connection})
+    return _clients[server_name]
+
+# 3. LLM & Graph Building Blocks
+async def bootstrap(get_tools, default_model=None):
+    """
+    Initialize the LLM client and discover MCP tools concurrently;
+    neither depends on the other, so startup costs max() instead of sum().
+    Returns the LLM and whatever get_tools() returned.
+    """
+    return await asyncio.gather(
+        asyncio.to_thread(
+            ChatGroq,
+            model=os.getenv("GROQ_MODEL", default_model),
+            groq_api_key=os.getenv("GROQ_API_KEY"),
+            temperature=0
+        ),
+        get_tools()
+    )
+
+def bind_tools(llm, tools):
+    """Bind MCP tools to the LLM and return it with a name -> tool lookup."""
+    if not tools:
+        return llm, {}
+    # Sorted so the tool schema in the request prefix is identical every turn
+    llm_with_tools = llm.bind_tools(sorted(tools, key=lambda t: t.name))
+    # Resolve tool names once instead of scanning the tool list per call
+    return llm_with_tools, {t.name: t for t in tools}
+
+async def stream_response(llm_with_tools, messages):
+    """Stream the response so tokens reach run_chat as they arrive, then merge the chunks."""
+    response = None
+    try:
+        async for chunk in llm_with_tools.astream(messages):
+            response = chunk if response is None else response + chunk
+    except ValueError as e:
+        # astream raises "No generation chunks were returned" itself on an empty stream;
+        # only then retry with a regular call, any other ValueError is a real failure
+        if response is not None or "No generation chunks" not in str(e):
+            raise
+        return await llm_with_tools.ainvoke(messages)
+    return message_chunk_to_message(response)
+
+def should_continue(state):
+    """
+    Route to the tools node whenever the LLM requested tools. Unknown names still go
+    there so every tool call gets a ToolMessage answer ("not a valid tool, try one of
+    [...]") the model can recover from; an unanswered tool call would be rejected by
+    the API on the next request.
+    """
+    last_message = state["messages"][-1]
+    if getattr(last_message, "tool_calls", None):
+        return "tools"
+    return END
+
+def _schema_properties(tool):
+    """
+    Parameter names a tool accepts. MCP tools with no parameters may send a JSON schema
+    without "properties", where tool.args would raise; treat that as "no parameters".
+    """
+    schema = tool.args_schema
+    if isinstance(schema, dict):
+        return schema.get("properties", {})
+    try:
+        return tool.args
+    except Exception:
+        return {}
+
+def make_tool_node(tool_map, default_args=None, postprocess=None):
+    """
+    Build a tools node that runs every tool call from the last AI message concurrently.
+    default_args are filled in for tools whose schema accepts them when the model omits them.
+    postprocess, if given, rewrites each ToolMessage inside the graph, before the next
+    chatbot hop can send it to the LLM.
+    """
+    default_args = default_args or {}
+
+    async def run_tool(tool_call):
+        """Invoke a single tool call, turning failures into an error ToolMessage."""
+        tool = tool_map.get(tool_call["name"])
+        if tool is None:
+            return ToolMessage(
+                content=f"Error: {tool_call['name']} is not a valid tool, try one of [{', '.join(tool_map)}].",
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                status="error"
+            )
+        props = _schema_properties(tool)
+        missing = {k: v for k, v in default_args.items() if k in props and k not in tool_call["args"]}
+        if missing:
+            tool_call = {**tool_call, "args": {**tool_call["args"], **missing}}
+        try:
+            # Passing the full tool call makes the tool return a ToolMessage itself
+            return await tool.ainvoke(tool_call)
+        except Exception as e:
+            return ToolMessage(
+                content=f"Error: {e!r}\n Please fix your mistakes.",
+                name=tool_call["name"],
+                tool_call_id=tool_call["id"],
+                status="error"
+            )
+
+    async def parallel_tool_node(state):
+        """Run every tool call from the last AI message concurrently, keeping their order."""
+        tool_calls = state["messages"][-1].tool_calls
+        results = await asyncio.gather(*[run_tool(tc) for tc in tool_calls])
+        if postprocess:
+            results = [postprocess(msg) for msg in results]
+        return {"messages": list(results)}
+
+    return parallel_tool_node
+
+def build_graph(state_schema, chatbot, tool_node=None, discovery=None):
+    """
+    Wire chatbot <-> tools with should_continue. discovery, if given, runs once between
+    START and the chatbot. Without tools the graph is a single chatbot call.
+    """
+    workflow = StateGraph(state_schema)
+    workflow.add_node("chatbot", chatbot)
+
+    # If tools exist, add them to the graph
+    if tool_node:
+        workflow.add_node("tools", tool_node)
+        if discovery:
+            workflow.add_node("discovery", discovery)
+            workflow.add_edge(START, "discovery")
+            workflow.add_edge("discovery", "chatbot")
+        else:
+            workflow.add_edge(START, "chatbot")
+        workflow.add_conditional_edges("chatbot", should_continue, ["tools", END])
+        workflow.add_edge("tools", "chatbot")
+    else:
+        workflow.add_edge(START, "chatbot")
+        workflow.add_edge("chatbot", END)
+
+    return workflow.compile()
+
+# 4. Chat Loop Helpers
+def read_user_input():
+    """Prompt for the next message; None means the user wants to quit."""
+    try:
+        user_input = input("\nYou: ")
+    except EOFError:
+        return None
+    if user_input.lower() in ["exit", "q", "quit"]:
+        return None
+    return user_input
+
+# Stream output is coalesced into batches so stdout is written once per batch
+STREAM_BATCH_SIZE = 8
+STREAM_FLUSH_INTERVAL = 0.05
+_STREAM_END = object()
+
+async def stream_in_batches(stream):
+    """Group chunks from an async stream into lists of up to STREAM_BATCH_SIZE,
+    yielding a partial batch once STREAM_FLUSH_INTERVAL seconds have passed."""
+    queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for chunk in stream:
+                queue.put_nowait(chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        finally:
+            queue.put_nowait(_STREAM_END)
+
+    loop = asyncio.get_running_loop()
+    producer = asyncio.create_task(produce())
+    batch, deadline = [], None
+    try:
+        while True:
+            timeout = None if deadline is None else max(0, deadline - loop.time())
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                yield batch
+                batch, deadline = [], None
+                continue
+
+            if item is _STREAM_END or isinstance(item, Exception):
+                if batch:
+                    yield batch
+                if item is not _STREAM_END:
+                    raise item
+                break
+
+            batch.append(item)
+            if deadline is None:
+                deadline = loop.time() + STREAM_FLUSH_INTERVAL
+            if len(batch) >= STREAM_BATCH_SIZE:
+                yield batch
+                batch, deadline = [], None
+    finally:
+        producer.cancel()
+
+def _format_token(payload, ai_open):
+    """
+    Render a stream_mode="messages" payload from the chatbot node.
+    Returns the text to print (or None) and whether an AI reply is now open.
+    """
+    token, metadata = payload
+    if metadata.get("langgraph_node") != "chatbot" or not isinstance(token.content, str) or not token.content:
+        return None, ai_open
+    return (token.content if ai_open else "\nAI: " + token.content), True
+
+async def stream_turn(agent, turn_state, render_update):
+    """
+    Run one turn, printing chatbot tokens as they arrive. Each node update goes to
+    render_update(node, values, streamed), which returns lines to print; streamed says
+    whether the chatbot reply was already printed token by token. Output is written
+    once per batch.
+    """
+    stream = agent.astream(turn_state, stream_mode=["updates", "messages"])
+    # True while an AI reply is being printed token by token
+    ai_open = False
+    async for batch in stream_in_batches(stream):
+        output = []
+        for mode, payload in batch:
+            if mode == "messages":
+                text, ai_open = _format_token(payload, ai_open)
+                if text:
+                    output.append(text)
+                continue
+
+            for node, values in payload.items():
+                streamed = node == "chatbot" and ai_open
+                if streamed:
+                    output.append("\n")
+                    ai_open = False
+                output.extend(render_update(node, values or {}, streamed))
+        if output:
+            sys.stdout.write("".join(output))
+            sys.stdout.flush()
+
+def run(main):
+    """Run the chat coroutine on uvloop when available; Windows keeps the default
+    Proactor loop, which the stdio MCP subprocess needs."""
+    runner = asyncio.run
+    if sys.platform != "win32":
+        try:
+            import uvloop
+            runner = uvloop.run
+        except ImportError:
+            pass
+    return runner(main)
@@ -1,19 +1,33 @@
 import os
-import asyncio
-from typing import Annotated, TypedDict, Union
+import sys
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+from typing import Annotated, TypedDict
 
 from dotenv import load_dotenv
-from langchain_groq import ChatGroq
-from langchain_mcp_adapters.client import MultiServerMCPClient
-from langgraph.graph import StateGraph, START, END
-from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
-from datetime import datetime
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from _mcp_agent_base import (
+    bind_tools, bootstrap, build_graph, get_mcp_client, make_tool_node, mcp_connection,
+    per_minute_system_message, read_user_input, run, stream_response, stream_turn
+)
 
 # Load environment variables from .env
 load_dotenv()
 
+# Session history is a ring buffer; older messages are dropped once it is full
+MAX_SESSION_MESSAGES = 40
+# Only the most recent messages are sent to the LLM each turn
+HISTORY_WINDOW = 5
+# Tool output beyond this many characters is cut before it is stored or resent
+MAX_TOOL_OUTPUT_CHARS = 1500
+_TRUNC_SUFFIX = "... [TRUNCATED TO SAVE TOKENS]"
+# Page size requested from paginated GitHub tools when the model doesn't pick one
+DEFAULT_PER_PAGE = 10
+
 # 1. Define the State
 class State(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
@@ -21,28 +35,49 @@ class State(TypedDict):
     github_owner: str
     github_repo: str
 
+@lru_cache(maxsize=8)
+def _static_system_prompt(owner: str, repo: str) -> str:
+    """Build the turn-invariant part of the system prompt once per target repo."""
+    system_instr = [
+        "You are the 'GitHub Control Engine'.",
+        f"PRIMARY TARGET: {owner}/{repo}",
+        "\n### CRITICAL OPERATING PROCEDURES ###",
+        f"1. **Owner**: Always use '{owner}' for the owner parameter.",
+        f"2. **Repo**: Always use '{repo}' (Note the underscores!).",
+        "3. **Commits**: For `list_commits`, use the `since` parameter for time filters. NEVER use `sha` for dates.",
+        "4. **Format**: Trigger tools directly. Do not output text-based tool calls.",
+        "5. **Feedback**: If a tool returns 'Not Found', verify you didn't swap underscores for hyphens."
+    ]
+    return "\n".join(system_instr)
+
+def _build_system_prompt(owner, repo, now):
+    """Static instructions first, the volatile timestamp last, so the prefix stays cacheable."""
+    return f"{_static_system_prompt(owner, repo)}\n\nToday is {now.strftime('%A, %B %d, %Y %I:%M %p')}."
+
+_system_message = per_minute_system_message(_build_system_prompt)
+
+def _truncate_tool_output(msg):
+    """Cut large tool output inside the graph so it is never sent to the LLM in full."""
+    if isinstance(msg.content, str) and len(msg.content) > MAX_TOOL_OUTPUT_CHARS:
+        msg.content = msg.content[:MAX_TOOL_OUTPUT_CHARS] + _TRUNC_SUFFIX
+    return msg
+
 # 2. Get Tools from MCP Server
 async def get_tools():
     """Connects to the GitHub MCP server and retrieves available tools."""
     print("Connecting to GitHub MCP Server...")
     github_token = os.getenv("GITHUB_PERSONAL_ACCESS_TOKEN")
     
-    if not github_token:
+    # The SSE server holds its own token, so only the stdio child needs one here
+    if not github_token and not os.getenv("GITHUB_MCP_URL"):
         print("Error: GITHUB_PERSONAL_ACCESS_TOKEN not found in .env file.")
         return [], None
 
-    client = MultiServerMCPClient(
-        {
-            "github": {
-                "command": "npx.cmd",
-                "args": ["-y", "@modelcontextprotocol/server-github"],
-                "transport": "stdio",
-                "env": {
-                    "GITHUB_PERSONAL_ACCESS_TOKEN": github_token
-                }
-            }
-        }
-    )
+    client = get_mcp_client("github", mcp_connection(
+        "GITHUB_MCP_URL",
+        "@modelcontextprotocol/server-github",
+        {"GITHUB_PERSONAL_ACCESS_TOKEN": github_token}
+    ))
     try:
         tools = await client.get_tools()
         print(f"Successfully loaded {len(tools)} tools from GitHub MCP.")
@@ -53,75 +88,42 @@ async def get_tools():
 
 # 3. Setup the Graph
 async def create_agent():
-    # Initialize LLM
-    llm = ChatGroq(
-        model=os.getenv("GROQ_MODEL", "llama-3.1-8b-instant"),
-        groq_api_key=os.getenv("GROQ_API_KEY"),
-        temperature=0
-    )
+    llm, (tools, client) = await bootstrap(get_tools, default_model="llama-3.1-8b-instant")
 
-    # Get MCP tools and bind to LLM
-    tools, client = await get_tools()
-    llm_with_tools = llm.bind_tools(tools) if tools else llm
+    # Bind MCP tools to LLM
+    llm_with_tools, tool_map = bind_tools(llm, tools)
 
     # Default settings from .env
     env_owner = os.getenv("GITHUB_OWNER", "el-noir")
     env_repo = os.getenv("GITHUB_REPO", "daily_control_engine")
 
     # Define the nodes
-    def chatbot(state: State):
+    async def chatbot(state: State):
         """Invoke the LLM with a professional agent persona."""
-        now = datetime.now()
-        current_time = now.strftime("%A, %B %d, %Y %I:%M %p")
-        
         # Pull owner and repo from state or defaults
         owner = state.get("github_owner") or env_owner
         repo = state.get("github_repo") or env_repo
         
-        system_instr = [
-            f"You are the 'GitHub Control Engine'. Today is {current_time}.",
-            f"PRIMARY TARGET: {owner}/{repo}",
-            "\n### CRITICAL OPERATING PROCEDURES ###",
-            f"1. **Owner**: Always use '{owner}' for the owner parameter.",
-            f"2. **Repo**: Always use '{repo}' (Note the underscores!).",
-            "3. **Commits**: For `list_commits`, use the `since` parameter for time filters. NEVER use `sha` for dates.",
-            "4. **Format**: Trigger tools directly. Do not output text-based tool calls.",
-            "5. **Feedback**: If a tool returns 'Not Found', verify you didn't swap underscores for hyphens."
-        ]
-        
-        system_message = SystemMessage(content="\n".join(system_instr))
         # Limit history to stay under token limits
-        messages = [system_message] + state["messages"][-5:]
-        response = llm_with_tools.invoke(messages)
-        return {"messages": [response]}
-
-    def should_continue(state: State):
-        last_message = state["messages"][-1]
-        if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-            return "tools"
-        return END
+        history = state["messages"]
+        messages = [_system_message(owner, repo), *islice(history, max(0, len(history) - HISTORY_WINDOW), None)]
+        return {"messages": [await stream_response(llm_with_tools, messages)]}
 
     def discovery_handler(state: State):
         """Ensures the discovery state is initialized."""
         return {"github_owner": env_owner, "github_repo": env_repo, "discovery_done": True}
 
-    # Build the graph
-    workflow = StateGraph(State)
-    workflow.add_node("chatbot", chatbot)
-    
-    if tools:
-        workflow.add_node("tools", ToolNode(tools))
-        workflow.add_node("discovery", discovery_handler)
-        
-        workflow.add_edge(START, "discovery")
-        workflow.add_edge("discovery", "chatbot")
-        workflow.add_conditional_edges("chatbot", should_continue, ["tools", END])
-        workflow.add_edge("tools", "chatbot")
-    else:
-        workflow.add_edge(START, "chatbot")
-        workflow.add_edge("chatbot", END)
+    if not tools:
+        return build_graph(State, chatbot), client
 
-    return workflow.compile(), client
+    tool_node = make_tool_node(
+        tool_map,
+        # Ask paginated tools for a small page so oversized payloads are never built;
+        # server-github spells the page size both ways depending on the tool
+        default_args={"perPage": DEFAULT_PER_PAGE, "per_page": DEFAULT_PER_PAGE},
+        postprocess=_truncate_tool_output
+    )
+    return build_graph(State, chatbot, tool_node, discovery=discovery_handler), client
 
 # 4. Interactive Chat Loop
 async def run_chat():
@@ -131,42 +133,41 @@ async def run_chat():
     
     # Initialize session state
     session_state = {
-        "messages": [], 
+        "messages": deque(maxlen=MAX_SESSION_MESSAGES), 
         "discovery_done": True, 
         "github_owner": os.getenv("GITHUB_OWNER", "el-noir"), 
         "github_repo": os.getenv("GITHUB_REPO", "daily_control_engine")
     }
-    
-    while True:
-        try:
-            user_input = input("\nYou: ")
-        except EOFError: break
-        if user_input.lower() in ["exit", "q", "quit"]: break
 
+    def render_update(node, values, streamed):
+        """Lines to print for one node update; also records its messages in the session."""
+        new_messages = values.get("messages", [])
+        output = []
+        if node == "chatbot":
+            last_msg = new_messages[-1]
+            if last_msg.content and not streamed: output.append(f"\nAI: {last_msg.content}\n")
+            if hasattr(last_msg, "tool_calls") and last_msg.tool_calls:
+                output.extend(
+                    f"\n[DEBUG Tool Call]: {tc['name']} with args: {tc['args']}\n"
+                    for tc in last_msg.tool_calls
+                )
+                output.append(f"\n[AI is calling GitHub tools: {', '.join([tc['name'] for tc in last_msg.tool_calls])}]\n")
+        elif node == "tools":
+            output.extend(f"\n[DEBUG Tool Result]: {msg.content[:300]}...\n" for msg in new_messages)
+
+        # Updates are per-node deltas, but never store the same message twice
+        history = session_state["messages"]
+        present = {id(m) for m in history}
+        history.extend(m for m in new_messages if id(m) not in present)
+        return output
+    
+    while (user_input := read_user_input()) is not None:
         session_state["messages"].append(HumanMessage(content=user_input))
         
         try:
-            async for chunk in agent.astream(session_state, stream_mode="updates"):
-                for node, values in chunk.items():
-                    if node == "chatbot":
-                        last_msg = values['messages'][-1]
-                        if last_msg.content: print(f"\nAI: {last_msg.content}")
-                        if hasattr(last_msg, "tool_calls") and last_msg.tool_calls:
-                            for tc in last_msg.tool_calls:
-                                print(f"\n[DEBUG Tool Call]: {tc['name']} with args: {tc['args']}")
-                            print(f"\n[AI is calling GitHub tools: {', '.join([tc['name'] for tc in last_msg.tool_calls])}]")
-                    elif node == "tools":
-                        for msg in values['messages']:
-                            print(f"\n[DEBUG Tool Result]: {msg.content[:300]}...")
-                
-                # Update shared state messages with truncation to save tokens
-                if "messages" in values:
-                    for msg in values["messages"]:
-                        # If it's a ToolMessage, truncate its content
-                        if hasattr(msg, "content") and isinstance(msg.content, str) and len(msg.content) > 1500:
-                            msg.content = msg.content[:1500] + "... [TRUNCATED TO SAVE TOKENS]"
-                        session_state["messages"].append(msg)
-                    
+            # The add_messages reducer expects a list, so hand the graph a snapshot
+            turn_state = {**session_state, "messages": list(session_state["messages"])}
+            await stream_turn(agent, turn_state, render_update)
         except Exception as e:
             print(f"\nError during execution: {e}")
 
@@ -176,6 +177,6 @@ async def run_chat():
 
 if __name__ == "__main__":
     try:
-        asyncio.run(run_chat())
+        run(run_chat())
     except KeyboardInterrupt:
         pass
@@ -1,4 +1,7 @@
-from typing import TypedDict, Annotated, List
+from functools import lru_cache
+from typing import TypedDict, Annotated, List, Tuple
+import numpy as np
+from numba import njit, prange
 from langgraph.graph import StateGraph, START, END
 
 class DailyState(TypedDict):
@@ -11,7 +14,13 @@ class DailyState(TypedDict):
     score: int
     suggestion: str
 
+def score_tasks_batch(energies: np.ndarray, tasks_matrix: List[List[str]]) -> List[List[str]]:
+    # Low-energy days get 2 tasks, everything else gets 5, decided for the whole batch at once
+    limits = np.where(np.asarray(energies) < 5, 2, 5)
+    return [tasks[:limit] for tasks, limit in zip(tasks_matrix, limits.tolist(), strict=True)]
+
 def score_tasks(state: DailyState) -> DailyState:
+    # A single day stays in plain Python; only bulk callers go through score_tasks_batch
     energy = state['energy_level']
     tasks = state['tasks']
 
@@ -28,9 +37,7 @@ def limit_to_3_tasks(state: DailyState) -> DailyState:
 
 def generate_plan(state: DailyState) -> DailyState:
     
-    state['suggestion'] = (
-        "Focus deeply on: " + ", ".join(state['selected_tasks'])
-    )
+    state['suggestion'] = "Focus deeply on: %s" % ", ".join(state['selected_tasks'])
     return state
 
 builder = StateGraph(DailyState)
@@ -48,8 +55,33 @@ builder.add_edge("generate_plan", END)
 
 morning_graph = builder.compile()
 
+# The morning plan depends only on energy and tasks, so identical inputs reuse the result
+@lru_cache(maxsize=1024)
+def _morning_template(energy_level: int, tasks: Tuple[str, ...]) -> Tuple[Tuple[str, ...], str]:
+    result = morning_graph.invoke({"energy_level": energy_level, "tasks": list(tasks)})
+    return tuple(result["selected_tasks"]), result["suggestion"]
+
+def plan_morning(state: DailyState) -> DailyState:
+    selected_tasks, suggestion = _morning_template(state["energy_level"], tuple(state["tasks"]))
+    return {**state, "selected_tasks": list(selected_tasks), "suggestion": suggestion}
+
+@njit(parallel=True, cache=True)
+def _score_kernel(completed_counts, selected_counts):
+    scores = np.zeros(selected_counts.shape[0], dtype=np.int32)
+    for i in prange(selected_counts.shape[0]):
+        # A day with nothing selected scores 0
+        if selected_counts[i] != 0:
+            scores[i] = round(completed_counts[i] / selected_counts[i] * 100)
+    return scores
+
+def analyze_performance_batch(completed_counts, selected_counts) -> np.ndarray:
+    return _score_kernel(
+        np.asarray(completed_counts, dtype=np.int32),
+        np.asarray(selected_counts, dtype=np.int32)
+    )
+
 def analyze_performance(state: DailyState) -> DailyState:
-    
+    # A single day stays in plain Python; only the batch path pays for the JIT kernel
     if len(state["selected_tasks"]) == 0:
         state["score"] =0
         return state
@@ -84,6 +116,19 @@ night_builder.add_edge("suggest_improvement", END)
 
 night_graph = night_builder.compile()
 
+# The evening review depends only on selected and completed tasks
+@lru_cache(maxsize=1024)
+def _night_template(selected_tasks: Tuple[str, ...], completed_tasks: Tuple[str, ...]) -> Tuple[int, str]:
+    result = night_graph.invoke({
+        "selected_tasks": list(selected_tasks),
+        "completed_tasks": list(completed_tasks)
+    })
+    return result["score"], result["suggestion"]
+
+def review_night(state: DailyState) -> DailyState:
+    score, suggestion = _night_template(tuple(state["selected_tasks"]), tuple(state["completed_tasks"]))
+    return {**state, "score": score, "suggestion": suggestion}
+
 if __name__ == "__main__":
     initial_state: DailyState = {
         "energy_level": 7,
@@ -102,7 +147,7 @@ if __name__ == "__main__":
         "suggestion": ""
     }
 
-    result = morning_graph.invoke(initial_state)
+    result = plan_morning(initial_state)
 
     print(result["suggestion"])
 
@@ -113,7 +158,7 @@ if __name__ == "__main__":
         "Gym"
     ]
 
-    night_result = night_graph.invoke(night_state)
+    night_result = review_night(night_state)
 
     print("Score:", night_result["score"])
     print("Suggestion:", night_result["suggestion"])